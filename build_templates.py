@@ -0,0 +1,31 @@
+"""Собирает шаблоны боссов из папки 'src' в один файл templates.npz для быстрой загрузки приложением."""
+import os
+
+import cv2
+import numpy as np
+
+SRC_FOLDER = "src"
+OUTPUT_FILE = "templates.npz"
+
+
+def build_templates(src_folder=SRC_FOLDER, output_file=OUTPUT_FILE):
+    """
+    Читает все .bmp из папки шаблонов и сохраняет их цветными (BGR) в сжатый архив NumPy.
+    Ключ каждого массива — имя файла без расширения.
+
+    Аргументы:
+        src_folder (str): Папка с исходными изображениями боссов.
+        output_file (str): Путь к создаваемому архиву .npz.
+    """
+    templates = {}
+    for filename in sorted(os.listdir(src_folder)):
+        if filename.lower().endswith(".bmp"):
+            img = cv2.imread(os.path.join(src_folder, filename), cv2.IMREAD_COLOR)
+            if img is not None:
+                templates[os.path.splitext(filename)[0]] = img
+    np.savez_compressed(output_file, **templates)
+    print(f"Сохранено шаблонов: {len(templates)} -> {output_file}")
+
+
+if __name__ == "__main__":
+    build_templates()
@@ -1,21 +1,35 @@
+import heapq
+import itertools
+import json
+import math
 import os
 import sys
 import time
 import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 import queue
 
 import cv2
 import numpy as np
-from PIL import ImageGrab
+from mss import mss
 
 import pyttsx3
 from PyQt6 import QtWidgets, QtCore
 from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QFont, QIcon
+from PyQt6.QtGui import QColor, QFont, QIcon, QPalette
 
 from MainWindow import Ui_MainWindow
 
 TIMER_DURATION = 19 * 60 + 55
+MATCH_THRESHOLD = 0.9
+CAPTURE_MARGIN = 100
+FULL_SCAN_EVERY = 60
+SCAN_INTERVAL_MS = 500
+CONFIG_FILE = "config.json"
+TEMPLATES_FILE = "templates.npz"
+# Все возможные значения таймера в формате MM:SS, индекс — оставшиеся секунды.
+_TIME_STRINGS = tuple(f"{r // 60:02d}:{r % 60:02d}" for r in range(TIMER_DURATION + 1))
 
 
 def resource_path(relative_path):
@@ -35,51 +49,141 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+def load_config():
+    """
+    Читает настройки приложения из CONFIG_FILE в рабочей папке.
+
+    Возвращает:
+        dict: Настройки или пустой словарь, если файла нет или он повреждён.
+    """
+    try:
+        with open(CONFIG_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def parse_capture_bbox(value):
+    """
+    Проверяет область захвата, прочитанную из настроек.
+
+    Аргументы:
+        value: Значение ключа capture_bbox из настроек.
+
+    Возвращает:
+        tuple | None: (x, y, ширина, высота) из целых чисел с положительными размерами
+        или None, если значение отсутствует или некорректно.
+    """
+    if not isinstance(value, (list, tuple)) or len(value) != 4:
+        return None
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in value):
+        return None
+    x, y, width, height = value
+    if width <= 0 or height <= 0:
+        return None
+    return x, y, width, height
+
+
+def save_config(config):
+    """
+    Сохраняет настройки приложения в CONFIG_FILE в рабочей папке.
+
+    Аргументы:
+        config (dict): Настройки для сохранения.
+    """
+    try:
+        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=4)
+    except OSError as e:
+        print(f"Ошибка сохранения настроек: {e}")
+
+
+def make_palette(color):
+    """
+    Создаёт палитру, задающую только цвет текста кнопки; остальные роли наследуются от родителя.
+
+    Аргументы:
+        color (str): Цвет текста (например, "red", "green", "black").
+
+    Возвращает:
+        QPalette: Палитра с ролью ButtonText.
+    """
+    palette = QPalette()
+    palette.setColor(QPalette.ColorRole.ButtonText, QColor(color))
+    return palette
+
+
 class ButtonTimer:
     """
     Класс, реализующий таймер для кнопки с отображением оставшегося времени и изменением цвета текста.
+    Состояние всех таймеров хранится в общих массивах NumPy главного окна, чтобы проверка
+    выполнялась одной векторной операцией; таймер хранит только свой индекс в них.
+    Вместо счётчика секунд хранится момент окончания по time.monotonic().
 
     Атрибуты:
         button: Qt кнопка, связанная с таймером.
         name (str): Название таймера (обычно текст кнопки).
+        index (int): Индекс таймера в общих массивах состояния.
+        expiry (float): Момент окончания таймера по time.monotonic().
         remaining (int): Оставшееся время в секундах.
         active (bool): Флаг активности таймера.
-        font (QFont): Шрифт для кнопки.
     """
-    def __init__(self, button, name, font):
+    def __init__(self, button, name, palettes, expiry, active, index):
         """
         Инициализация таймера.
 
         Аргументы:
             button: Qt кнопка.
             name (str): Название таймера.
-            font (QFont): Шрифт для текста кнопки.
+            palettes (dict): Общие палитры кнопок {цвет: QPalette}.
+            expiry (numpy.ndarray): Общий массив моментов окончания всех таймеров.
+            active (numpy.ndarray): Общий массив флагов активности всех таймеров.
+            index (int): Индекс таймера в общих массивах.
         """
         self.button = button
         self.name = name
-        self.remaining = 0
-        self.active = False
-        self.font = font
+        self.index = index
+        self._palettes = palettes
+        self._expiry = expiry
+        self._active = active
+        self._last_color = None
         self.set_text_color("black")
 
-    def start(self):
+    @property
+    def expiry(self):
         """
-        Запускает таймер, устанавливая время в TIMER_DURATION и меняя цвет текста на красный.
+        Возвращает момент окончания таймера из общего массива.
         """
-        self.remaining = TIMER_DURATION
-        self.active = True
-        self.set_text_color("red")
+        return float(self._expiry[self.index])
 
-    def tick(self):
+    @property
+    def remaining(self):
         """
-        Уменьшает оставшееся время на 1 секунду, если таймер активен.
-        При достижении 0 меняет цвет текста на зелёный и деактивирует таймер.
+        Возвращает оставшееся время таймера в целых секундах (с округлением вверх),
+        ограниченное диапазоном от 0 до TIMER_DURATION.
         """
-        if self.active and self.remaining > 0:
-            self.remaining -= 1
-            if self.remaining == 0:
-                self.active = False
-                self.set_text_color("green")
+        # Округление (t + TIMER_DURATION) - t может дать чуть больше TIMER_DURATION,
+        # а значение служит индексом в _TIME_STRINGS.
+        return min(max(math.ceil(self.expiry - time.monotonic()), 0), TIMER_DURATION)
+
+    @property
+    def active(self):
+        """
+        Возвращает флаг активности таймера из общего массива.
+        """
+        return bool(self._active[self.index])
+
+    def start(self):
+        """
+        Запускает таймер на TIMER_DURATION секунд от текущего момента и меняет цвет текста на красный.
+
+        Возвращает:
+            float: Момент окончания таймера.
+        """
+        self._expiry[self.index] = time.monotonic() + TIMER_DURATION
+        self._active[self.index] = True
+        self.set_text_color("red")
+        return self.expiry
 
     def is_active(self):
         """
@@ -97,85 +201,463 @@ class ButtonTimer:
         Возвращает:
             str: Форматированное время.
         """
-        m, s = divmod(self.remaining, 60)
-        return f"{m:02d}:{s:02d}"
+        return _TIME_STRINGS[self.remaining]
 
     def set_text_color(self, color):
         """
-        Устанавливает цвет текста кнопки и применяет шрифт.
+        Устанавливает цвет текста кнопки заранее созданной палитрой, минуя разбор таблицы стилей.
+        Если цвет не изменился, кнопка не трогается.
+
+        Аргументы:
+            color (str): Цвет текста: "red", "green" или "black".
+        """
+        if color == self._last_color:
+            return
+        self.button.setPalette(self._palettes[color])
+        self._last_color = color
+
+
+class TemplateBank:
+    """
+    Набор шаблонов боссов, подготовленных для двухуровневого сопоставления.
+
+    Грубый проход идёт по уменьшенным вдвое скриншоту и шаблонам через дискретное преобразование
+    Фурье: шаблоны один раз при загрузке центрируются и нормируются, поэтому корреляция с ними
+    совпадает с TM_CCOEFF_NORMED, а спектр скриншота на каждом тике считается один раз для всех
+    шаблонов. Если OpenCV собран с CUDA и видеокарта доступна, грубый проход выполняется на ней
+    через cv2.cuda.createTemplateMatching. Оценка грубого прохода не используется как порог:
+    на нечётном смещении таблички или у малоконтрастного шаблона она заметно ниже реальной,
+    хотя пик всё равно находится с точностью до пикселя, и его может обогнать соседняя табличка
+    другого босса. Поэтому для каждого шаблона берутся несколько локальных максимумов грубой карты
+    (главный пик и до COARSE_MAX_PEAKS пиков не ниже COARSE_PEAK_FLOOR), и каждый из них проверяется
+    cv2.matchTemplate в полном разрешении в небольшой области вокруг него.
+
+    Атрибуты:
+        templates (dict): Исходные шаблоны {ключ: изображение в градациях серого}.
+    """
+    CONFIRM_PADDING = 4
+    COARSE_PEAK_FLOOR = 0.45
+    COARSE_MAX_PEAKS = 8
+    SPECTRUM_CACHE_MAX_PIXELS = 512 * 512
+
+    def __init__(self, templates):
+        """
+        Инициализация набора шаблонов.
+
+        Аргументы:
+            templates (dict): Словарь {ключ: изображение в градациях серого}.
+        """
+        self.templates = templates
+        self._coarse = {}
+        self._gpu_coarse = {}
+        self._gpu_matcher = None
+        self._spectra = {}
+        self._spectra_size = None
+        self._image_buffer = None
+        self._frame_shape = None
+        use_cuda = _cuda_available()
+        for key, template in templates.items():
+            small = cv2.pyrDown(template)
+            centered = small.astype(np.float32)
+            centered -= centered.mean()
+            norm = float(np.linalg.norm(centered))
+            if norm > 0:
+                self._coarse[key] = centered / norm
+                if use_cuda:
+                    gpu_template = cv2.cuda_GpuMat()
+                    gpu_template.upload(small)
+                    self._gpu_coarse[key] = gpu_template
+        if use_cuda:
+            self._gpu_matcher = cv2.cuda.createTemplateMatching(cv2.CV_8UC1, cv2.TM_CCOEFF_NORMED)
+
+    def match(self, image, executor=None):
+        """
+        Сопоставляет изображение со всеми шаблонами, выдавая результаты в порядке шаблонов.
+        Генератор ленивый: при выходе из цикла оставшиеся шаблоны не обсчитываются.
+
+        Аргументы:
+            image (numpy.ndarray): Изображение в градациях серого (uint8).
+            executor (ThreadPoolExecutor | None): Пул для параллельного грубого прохода на процессоре.
+
+        Возвращает:
+            generator: Кортежи (ключ, максимальная оценка, координаты максимума в полном разрешении).
+        """
+        small = cv2.pyrDown(image)
+        if self._gpu_matcher is not None:
+            coarse_results = self._match_coarse_gpu(small)
+        else:
+            coarse_results = self._match_coarse(small, executor)
+        for key, coarse_locs in coarse_results:
+            best_val, best_loc = -1.0, (0, 0)
+            for coarse_loc in coarse_locs:
+                max_val, max_loc = self._confirm(image, self.templates[key], coarse_loc)
+                if max_val > best_val:
+                    best_val, best_loc = max_val, max_loc
+                if best_val >= MATCH_THRESHOLD:
+                    break
+            yield key, best_val, best_loc
+
+    def _match_coarse(self, image, executor=None):
+        """
+        Грубый проход: корреляция уменьшенного скриншота с уменьшенными шаблонами через общий спектр.
+        С пулом потоков шаблоны обсчитываются параллельно (cv2 и NumPy отпускают GIL), результаты
+        выдаются в исходном порядке, а при выходе из цикла ещё не начатые задачи отменяются.
+
+        Аргументы:
+            image (numpy.ndarray): Уменьшенное изображение в градациях серого (uint8).
+            executor (ThreadPoolExecutor | None): Пул потоков или None для последовательного расчёта.
+
+        Возвращает:
+            generator: Кортежи (ключ, список координат пиков-кандидатов).
+        """
+        height, width = image.shape
+        dft_size = (cv2.getOptimalDFTSize(height), cv2.getOptimalDFTSize(width))
+        # Спектры шаблонов кэшируются, пока размер кадра не меняется (обычно это область захвата),
+        # но только для небольших кадров, чтобы полноэкранный поиск не держал в памяти по кадру на шаблон.
+        if self._spectra_size != dft_size:
+            self._spectra = {}
+            self._spectra_size = dft_size
+        cache_spectra = dft_size[0] * dft_size[1] <= self.SPECTRUM_CACHE_MAX_PIXELS
+        # Буфер под кадр переиспользуется между тиками: поля за пределами кадра остаются нулевыми
+        # с момента создания, перезаписывается только сам кадр.
+        if self._frame_shape != image.shape:
+            self._image_buffer = np.zeros(dft_size, dtype=np.float32)
+            self._frame_shape = image.shape
+        self._image_buffer[:height, :width] = image
+        image_spectrum = cv2.dft(self._image_buffer)
+        sums, sqsums = cv2.integral2(image)
+
+        tasks = []
+        inv_deviations = {}
+        for key, template in self._coarse.items():
+            t_height, t_width = template.shape
+            if t_height > height or t_width > width:
+                continue
+            if template.shape not in inv_deviations:
+                inv_deviations[template.shape] = _window_inv_deviation(sums, sqsums, t_height, t_width)
+            tasks.append((key, template, image_spectrum, inv_deviations[template.shape], cache_spectra))
+
+        if executor is None:
+            for task in tasks:
+                yield self._coarse_score(*task)
+            return
+        futures = [executor.submit(self._coarse_score, *task) for task in tasks]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _coarse_score(self, key, template, image_spectrum, inv_deviation, cache_spectra):
+        """
+        Считает карту TM_CCOEFF_NORMED одного уменьшенного шаблона по готовому спектру кадра.
+
+        Аргументы:
+            key (str): Ключ шаблона.
+            template (numpy.ndarray): Центрированный и нормированный уменьшенный шаблон (float32).
+            image_spectrum (numpy.ndarray): Спектр кадра в упакованном формате cv2.dft.
+            inv_deviation (numpy.ndarray): Обратные отклонения окон кадра под размер шаблона.
+            cache_spectra (bool): Сохранять ли спектр шаблона в кэш.
+
+        Возвращает:
+            tuple: (ключ, список координат пиков-кандидатов).
+        """
+        template_spectrum = self._spectra.get(key)
+        # Задача прошлого тика могла дописать в кэш спектр под прежний размер кадра.
+        if template_spectrum is None or template_spectrum.shape != image_spectrum.shape:
+            t_height, t_width = template.shape
+            padded = np.zeros(image_spectrum.shape, dtype=np.float32)
+            padded[:t_height, :t_width] = template
+            template_spectrum = cv2.dft(padded)
+            if cache_spectra:
+                self._spectra[key] = template_spectrum
+        spectrum = cv2.mulSpectrums(image_spectrum, template_spectrum, 0, conjB=True)
+        corr = cv2.idft(spectrum, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+        res = corr[:inv_deviation.shape[0], :inv_deviation.shape[1]]
+        res *= inv_deviation
+        return key, self._coarse_peaks(res, template.shape)
+
+    def _match_coarse_gpu(self, image):
+        """
+        Грубый проход на видеокарте: cv2.cuda.createTemplateMatching по уменьшенным шаблонам.
+
+        Аргументы:
+            image (numpy.ndarray): Уменьшенное изображение в градациях серого (uint8).
+
+        Возвращает:
+            generator: Кортежи (ключ, список координат пиков-кандидатов).
+        """
+        height, width = image.shape
+        gpu_image = cv2.cuda_GpuMat()
+        gpu_image.upload(image)
+        gpu_result = cv2.cuda_GpuMat()
+        for key, gpu_template in self._gpu_coarse.items():
+            t_width, t_height = gpu_template.size()
+            if t_height > height or t_width > width:
+                continue
+            gpu_result = self._gpu_matcher.match(gpu_image, gpu_template, result=gpu_result)
+            yield key, self._coarse_peaks(gpu_result.download(), (t_height, t_width))
+
+    def _coarse_peaks(self, res, template_shape):
+        """
+        Выбирает на грубой карте оценок пики-кандидаты с подавлением соседей: главный максимум
+        всегда, а следующие — пока их оценка не ниже COARSE_PEAK_FLOOR, но не больше COARSE_MAX_PEAKS.
+        После каждого пика его окрестность размером в половину шаблона исключается из поиска.
+        Карта изменяется на месте.
+
+        Аргументы:
+            res (numpy.ndarray): Карта оценок грубого прохода (float32).
+            template_shape (tuple): Размер уменьшенного шаблона (высота, ширина).
+
+        Возвращает:
+            list: Координаты пиков (x, y) в порядке убывания оценки.
+        """
+        half_height = max(template_shape[0] // 2, 1)
+        half_width = max(template_shape[1] // 2, 1)
+        peaks = []
+        while len(peaks) < self.COARSE_MAX_PEAKS:
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+            if peaks and max_val < self.COARSE_PEAK_FLOOR:
+                break
+            peaks.append(max_loc)
+            x, y = max_loc
+            res[max(y - half_height, 0):y + half_height + 1, max(x - half_width, 0):x + half_width + 1] = -1.0
+        return peaks
+
+    def _confirm(self, image, template, coarse_loc):
+        """
+        Считает оценку шаблона в полном разрешении в окрестности пика грубого прохода.
 
         Аргументы:
-            color (str): Цвет текста (например, "red", "green", "black").
+            image (numpy.ndarray): Изображение в градациях серого (uint8) в полном разрешении.
+            template (numpy.ndarray): Исходный шаблон (uint8).
+            coarse_loc (tuple): Координаты пика грубого прохода (x, y).
+
+        Возвращает:
+            tuple: (максимальная оценка, координаты максимума в полном разрешении).
         """
-        self.button.setFont(self.font)
-        self.button.setStyleSheet(f"color: {color};")
+        pad = self.CONFIRM_PADDING
+        t_height, t_width = template.shape
+        x0 = max(coarse_loc[0] * 2 - pad, 0)
+        y0 = max(coarse_loc[1] * 2 - pad, 0)
+        x1 = min(coarse_loc[0] * 2 + t_width + pad, image.shape[1])
+        y1 = min(coarse_loc[1] * 2 + t_height + pad, image.shape[0])
+        res = cv2.matchTemplate(image[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        return max_val, (x0 + max_loc[0], y0 + max_loc[1])
+
+
+def _cuda_available():
+    """
+    Проверяет, собран ли OpenCV с поддержкой CUDA и есть ли доступная видеокарта.
+
+    Возвращает:
+        bool: True, если можно использовать модуль cv2.cuda.
+    """
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
+def _window_inv_deviation(sums, sqsums, height, width):
+    """
+    Считает по интегральным изображениям обратную величину корня из суммы квадратов отклонений
+    от среднего для каждого окна размера height x width (знаменатель TM_CCOEFF_NORMED без нормы шаблона).
+    Умножение карты корреляции на неё дешевле поэлементного деления для каждого шаблона.
+    Для однотонных окон возвращается 0, чтобы они не давали ложных совпадений.
+
+    Возвращает:
+        numpy.ndarray: Карта размера (H - height + 1, W - width + 1), float32.
+    """
+    def window(integral):
+        return (integral[height:, width:] - integral[:-height, width:]
+                - integral[height:, :-width] + integral[:-height, :-width])
+
+    window_sum = window(sums).astype(np.float64)
+    variance = window(sqsums) - window_sum * window_sum / (height * width)
+    deviation = np.sqrt(np.maximum(variance, 0))
+    inv_deviation = np.zeros(deviation.shape, dtype=np.float32)
+    np.divide(1.0, deviation, out=inv_deviation, where=deviation > 1.0)
+    return inv_deviation
 
 
 class ScannerThread(QtCore.QThread):
     """
     Поток для фонового сканирования экрана на наличие изображений боссов с помощью шаблонного сопоставления.
+    Сканирование запускается QTimer в собственном цикле событий потока каждые SCAN_INTERVAL_MS мс.
+
+    Пока область захвата неизвестна, сканируется весь основной монитор; после первого обнаружения
+    босса сканер ограничивает захват областью вокруг найденного шаблона и сохраняет её.
+    Отсутствие боссов в области её не сбрасывает: табличка видна только пока босс в таргете.
+    Чтобы заметить сдвиг окна игры, каждый FULL_SCAN_EVERY-й скан делается по всему монитору;
+    если босс найден там вне текущей области, область переносится к нему. Область сбрасывается
+    только если она перестала помещаться в монитор (например, сменили разрешение).
 
     Сигналы:
         boss_detected (str): Сигнал с именем обнаруженного босса.
+        capture_bbox_located (int, int, int, int): Сигнал с найденной областью захвата (x, y, ширина, высота).
+        capture_bbox_reset: Сигнал о сбросе области захвата.
     """
     boss_detected = pyqtSignal(str)
+    capture_bbox_located = pyqtSignal(int, int, int, int)
+    capture_bbox_reset = pyqtSignal()
 
-    def __init__(self, boss_images, template_to_boss_name):
+    def __init__(self, template_bank, template_to_boss_name, capture_bbox=None):
         """
         Инициализация потока сканера.
 
         Аргументы:
-            boss_images (dict): Словарь с шаблонами изображений боссов.
+            template_bank (TemplateBank): Подготовленные шаблоны изображений боссов.
             template_to_boss_name (dict): Сопоставление ключей шаблонов с именами боссов.
+            capture_bbox (tuple | None): Область захвата экрана (x, y, ширина, высота) или None.
         """
         super().__init__()
-        self.boss_images = boss_images
+        self.template_bank = template_bank
         self.template_to_boss_name = template_to_boss_name
-        self.active = False
+        self.capture_bbox = parse_capture_bbox(capture_bbox)
         self.last_detected_boss = None
-        self.lock = threading.Lock()
+        self._scans_since_full = 0
+        self._last_hash = None
+        self._sct = None
+        self._pool = ThreadPoolExecutor(max_workers=max((os.cpu_count() or 2) // 2, 1))
 
     def run(self):
         """
-        Основной цикл потока: периодически захватывает экран, ищет совпадения с шаблонами,
+        Тело потока: создаёт захват экрана и таймер сканирования, затем крутит цикл событий потока
+        до вызова stop_scan().
+        """
+        # Экземпляр mss создаётся в самом потоке: дескрипторы захвата экрана привязаны к потоку.
+        self._last_hash = None
+        with mss() as sct:
+            self._sct = sct
+            timer = QtCore.QTimer()
+            timer.setInterval(SCAN_INTERVAL_MS)
+            # Сам объект QThread живёт в главном потоке, поэтому без прямого соединения
+            # слот ушёл бы в очередь GUI-потока.
+            timer.timeout.connect(self._do_scan, Qt.ConnectionType.DirectConnection)
+            timer.start()
+            self._do_scan()
+            self.exec()
+            timer.stop()
+        self._sct = None
+
+    def _do_scan(self):
+        """
+        Один шаг сканирования: захватывает экран, ищет совпадения с шаблонами,
         при обнаружении нового босса отправляет сигнал boss_detected.
-        """
-        while True:
-            with self.lock:
-                if not self.active:
+        Если уменьшенная копия кадра не изменилась с прошлого шага, сопоставление пропускается.
+        """
+        try:
+            region, full_frame = self._capture_region()
+            raw = self._sct.grab(region)
+            frame = np.frombuffer(raw.bgra, dtype=np.uint8).reshape(raw.height, raw.width, 4)
+            # Вместо взвешенного перевода в оттенки серого берётся зелёный канал BGRA одной копией:
+            # для контрастных табличек с именами боссов его достаточно, а шаблоны готовятся так же.
+            screenshot_cv = np.ascontiguousarray(frame[:, :, 1])
+            thumb = cv2.resize(screenshot_cv, (32, 32), interpolation=cv2.INTER_AREA)
+            frame_hash = zlib.crc32(thumb.tobytes())
+            if frame_hash == self._last_hash:
+                return
+            self._last_hash = frame_hash
+            for template_key, max_val, max_loc in self.template_bank.match(screenshot_cv, self._pool):
+                if max_val < MATCH_THRESHOLD:
+                    continue
+                if full_frame:
+                    self._locate_capture_bbox(region, template_key, max_loc)
+                    full_frame = False
+                if self.last_detected_boss != template_key:
+                    boss_name = self.template_to_boss_name.get(template_key, template_key)
+                    self.last_detected_boss = template_key
+                    self.boss_detected.emit(boss_name)
                     break
-            try:
-                screenshot = ImageGrab.grab()
-                screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-                for template_key, template in self.boss_images.items():
-                    res = cv2.matchTemplate(screenshot_cv, template, cv2.TM_CCOEFF_NORMED)
-                    _, max_val, _, _ = cv2.minMaxLoc(res)
-                    if max_val >= 0.9 and self.last_detected_boss != template_key:
-                        boss_name = self.template_to_boss_name.get(template_key, template_key)
-                        self.last_detected_boss = template_key
-                        self.boss_detected.emit(boss_name)
-                        break
-                else:
-                    self.last_detected_boss = None
-            except Exception as e:
-                print(f"Ошибка сканера: {e}")
-            time.sleep(0.5)
+            else:
+                self.last_detected_boss = None
+        except Exception as e:
+            print(f"Ошибка сканера: {e}")
+
+    def _capture_region(self):
+        """
+        Возвращает область захвата в формате mss: сохранённую область или весь основной монитор.
+        Пока область известна, каждый FULL_SCAN_EVERY-й скан всё равно идёт по всему монитору.
+        Область, не помещающаяся в монитор, сбрасывается.
+
+        Возвращает:
+            tuple: (словарь с ключами left, top, width, height; True, если это весь монитор).
+        """
+        monitor = self._sct.monitors[1]
+        if self.capture_bbox is None:
+            return monitor, True
+        x, y, width, height = self.capture_bbox
+        if (x < monitor["left"] or y < monitor["top"]
+                or x + width > monitor["left"] + monitor["width"]
+                or y + height > monitor["top"] + monitor["height"]):
+            self._reset_capture_bbox()
+            return monitor, True
+        self._scans_since_full += 1
+        if self._scans_since_full >= FULL_SCAN_EVERY:
+            self._scans_since_full = 0
+            return monitor, True
+        return {"left": x, "top": y, "width": width, "height": height}, False
+
+    def _reset_capture_bbox(self):
+        """
+        Сбрасывает область захвата, возвращая сканер к поиску по всему монитору,
+        и сообщает об этом сигналом capture_bbox_reset.
+        """
+        self.capture_bbox = None
+        self._scans_since_full = 0
+        self._last_hash = None
+        self.capture_bbox_reset.emit()
+
+    def _locate_capture_bbox(self, region, template_key, max_loc):
+        """
+        Запоминает область захвата вокруг найденного шаблона с отступом CAPTURE_MARGIN
+        и сообщает о ней сигналом capture_bbox_located. Если найденный шаблон целиком лежит
+        в текущей области, она не меняется.
+
+        Аргументы:
+            region (dict): Область, в которой был сделан снимок.
+            template_key (str): Ключ найденного шаблона.
+            max_loc (tuple): Координаты совпадения внутри снимка (x, y).
+        """
+        t_height, t_width = self.template_bank.templates[template_key].shape
+        if self.capture_bbox is not None:
+            bx, by, b_width, b_height = self.capture_bbox
+            left = region["left"] + max_loc[0]
+            top = region["top"] + max_loc[1]
+            if (bx <= left and by <= top
+                    and left + t_width <= bx + b_width and top + t_height <= by + b_height):
+                return
+        x0 = max(max_loc[0] - CAPTURE_MARGIN, 0)
+        y0 = max(max_loc[1] - CAPTURE_MARGIN, 0)
+        x1 = min(max_loc[0] + t_width + CAPTURE_MARGIN, region["width"])
+        y1 = min(max_loc[1] + t_height + CAPTURE_MARGIN, region["height"])
+        self.capture_bbox = (region["left"] + x0, region["top"] + y0, x1 - x0, y1 - y0)
+        self.capture_bbox_located.emit(*self.capture_bbox)
 
     def start_scan(self):
         """
-        Активирует сканирование и запускает поток, если он ещё не запущен.
+        Запускает поток сканера. Если предыдущий запуск ещё завершается после stop_scan(),
+        сначала дожидается его окончания.
         """
-        with self.lock:
-            self.active = True
-        if not self.isRunning():
-            self.start()
+        self.wait()
+        self.start()
 
     def stop_scan(self):
         """
-        Деактивирует сканирование, что приведёт к завершению цикла run().
+        Останавливает цикл событий потока, что завершает run() сразу после текущего шага сканирования.
         """
-        with self.lock:
-            self.active = False
+        self.quit()
+
+    def shutdown(self):
+        """
+        Останавливает сканер, дожидается завершения потока и освобождает пул потоков сопоставления.
+        """
+        self.stop_scan()
+        self.wait()
+        self._pool.shutdown(cancel_futures=True)
 
 
 class SpeechEngine:
@@ -184,23 +666,46 @@ class SpeechEngine:
     """
     def __init__(self, rate_delta=-5, volume=1.0):
         """
-        Инициализация движка озвучки и запуск рабочего потока.
+        Запуск рабочего потока озвучки.
+        Сам движок pyttsx3 создаётся уже в рабочем потоке, чтобы его медленная инициализация
+        не задерживала построение окна; тексты, пришедшие раньше, ждут в очереди.
 
         Аргументы:
             rate_delta (int): Смещение скорости речи относительно стандартной.
             volume (float): Громкость речи (0.0 - 1.0).
         """
-        self.engine = pyttsx3.init()
-        self.engine.setProperty('rate', self.engine.getProperty('rate') + rate_delta)
-        self.engine.setProperty('volume', volume)
+        self.rate_delta = rate_delta
+        self.volume = volume
+        self.engine = None
+        self.failed = False
+        self._ready = threading.Event()
         self.queue = queue.Queue()
         self.thread = threading.Thread(target=self._worker, daemon=True)
         self.thread.start()
 
     def _worker(self):
         """
-        Цикл рабочего потока, который последовательно озвучивает поступающие тексты из очереди.
-        """
+        Цикл рабочего потока: инициализирует движок, затем последовательно озвучивает
+        поступающие тексты из очереди. Если движок не удалось создать, ошибка выводится,
+        озвучка отключается, а накопившаяся очередь очищается.
+        """
+        try:
+            self.engine = pyttsx3.init()
+            self.engine.setProperty('rate', self.engine.getProperty('rate') + self.rate_delta)
+            self.engine.setProperty('volume', self.volume)
+        except Exception as e:
+            print(f"Ошибка озвучки: {e}")
+            self.engine = None
+            self.failed = True
+            self._ready.set()
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.queue.task_done()
+            return
+        self._ready.set()
         while True:
             text = self.queue.get()
             if text is None:
@@ -209,13 +714,27 @@ class SpeechEngine:
             self.engine.runAndWait()
             self.queue.task_done()
 
+    def wait_ready(self, timeout=None):
+        """
+        Ожидает окончания инициализации движка озвучки.
+
+        Аргументы:
+            timeout (float | None): Максимальное время ожидания в секундах.
+
+        Возвращает:
+            bool: True, если движок готов; False, если время вышло или инициализация не удалась.
+        """
+        return self._ready.wait(timeout) and not self.failed
+
     def speak(self, text):
         """
-        Добавляет текст в очередь для озвучки.
+        Добавляет текст в очередь для озвучки. Если движок не удалось инициализировать, ничего не делает.
 
         Аргументы:
             text (str): Текст для озвучивания.
         """
+        if self.failed:
+            return
         self.queue.put(text)
 
     def stop(self):
@@ -235,6 +754,11 @@ class MainWindow(QtWidgets.QMainWindow):
         "btn_kaballo", "btn_flind", "btn_garpy", "btn_gigant", "btn_minotaur", "btn_chabon",
         "btn_bug", "btn_leprikon", "btn_skelet", "btn_spider"
     ]
+    # Общий шрифт кнопок таймеров. Создаётся при первом построении окна, а не при объявлении класса:
+    # QFont нельзя безопасно создавать до QApplication.
+    _FONT = None
+    # Палитры трёх цветов текста кнопок {цвет: QPalette}, переключаемые вместо таблиц стилей.
+    _PALETTES = None
 
     def __init__(self):
         """
@@ -247,28 +771,48 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.speech = SpeechEngine()
 
-        font = QFont("Comic Sans MS", 7, QFont.Weight.Bold)
+        if MainWindow._FONT is None:
+            MainWindow._FONT = QFont("Comic Sans MS", 7, QFont.Weight.Bold)
+        if MainWindow._PALETTES is None:
+            MainWindow._PALETTES = {color: make_palette(color) for color in ("black", "red", "green")}
+        self.expiry = np.zeros(len(self.BUTTON_NAMES), dtype=np.float64)
+        self.active = np.zeros(len(self.BUTTON_NAMES), dtype=bool)
+        self.announced = np.zeros(len(self.BUTTON_NAMES), dtype=bool)
+        self._heap = []
+        self._heap_seq = itertools.count()
         self.timers = []
-        for name in self.BUTTON_NAMES:
+        for index, name in enumerate(self.BUTTON_NAMES):
             btn = getattr(self.ui, name)
-            timer = ButtonTimer(btn, btn.text(), font)
+            btn.setFont(MainWindow._FONT)
+            timer = ButtonTimer(btn, btn.text(), MainWindow._PALETTES, self.expiry, self.active, index)
             btn.clicked.connect(lambda _, t=timer: self.handle_button(t))
             self.timers.append(timer)
+        self._timer_by_name = {timer.name: timer for timer in self.timers}
 
         self.ui.label_now.setText("")
         self.ui.label_next.setText("")
         self.ui.label_timer.setText("")
+        self._last_next = ""
+        self._last_time = ""
 
-        self.boss_images = self._load_boss_images()
+        self.template_bank = self._load_boss_images()
         self.template_to_boss_name = {name[4:]: getattr(self.ui, name).text() for name in self.BUTTON_NAMES}
 
         self.scanner_active = False
-        self.scanner_thread = ScannerThread(self.boss_images, self.template_to_boss_name)
+        self.config = load_config()
+        capture_bbox = parse_capture_bbox(self.config.get("capture_bbox"))
+        if capture_bbox is None and "capture_bbox" in self.config:
+            print("Некорректная область захвата в настройках, она сброшена")
+            del self.config["capture_bbox"]
+            save_config(self.config)
+        self.scanner_thread = ScannerThread(self.template_bank, self.template_to_boss_name, capture_bbox)
         self.scanner_thread.boss_detected.connect(self.on_boss_detected)
+        self.scanner_thread.capture_bbox_located.connect(self.on_capture_bbox_located)
+        self.scanner_thread.capture_bbox_reset.connect(self.on_capture_bbox_reset)
 
         self.ui.btn_scaner.clicked.connect(self.toggle_scanner)
         self.ui.btn_scaner.setText("Сканер боссов")
-        self.ui.btn_scaner.setStyleSheet("color: black;")
+        self.ui.btn_scaner.setPalette(MainWindow._PALETTES["black"])
         self.scaner_font = self.ui.btn_scaner.font()
         self.ui.btn_scaner.setFixedSize(self.ui.btn_scaner.size())
 
@@ -278,21 +822,16 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def _load_boss_images(self):
         """
-        Загружает шаблоны изображений боссов из папки 'src'.
+        Загружает шаблоны изображений боссов из архива TEMPLATES_FILE одним чтением файла
+        и готовит их к сопоставлению. Архив собирается из папки 'src' скриптом build_templates.py.
+        Как и у скриншота, от шаблонов берётся только зелёный канал.
 
         Возвращает:
-            dict: Словарь {ключ: изображение в градациях серого}.
-        """
-        boss_images = {}
-        src_folder = resource_path("src")
-        for filename in os.listdir(src_folder):
-            if filename.lower().endswith(".bmp"):
-                key = os.path.splitext(filename)[0]
-                img_path = os.path.join(src_folder, filename)
-                img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                if img is not None:
-                    boss_images[key] = img
-        return boss_images
+            TemplateBank: Набор нормированных шаблонов боссов.
+        """
+        with np.load(resource_path(TEMPLATES_FILE)) as data:
+            boss_images = {key: np.ascontiguousarray(data[key][:, :, 1]) for key in data.files}
+        return TemplateBank(boss_images)
 
     def handle_button(self, timer):
         """
@@ -301,34 +840,70 @@ class MainWindow(QtWidgets.QMainWindow):
         Аргументы:
             timer (ButtonTimer): Таймер, связанный с кнопкой.
         """
-        timer.start()
+        self.start_timer(timer)
         self.ui.label_now.setText(timer.name)
 
+    def start_timer(self, timer):
+        """
+        Запускает таймер и добавляет его в кучу ближайших окончаний.
+        Прежние записи перезапущенного таймера остаются в куче и отбрасываются лениво в update_labels.
+
+        Аргументы:
+            timer (ButtonTimer): Запускаемый таймер.
+        """
+        expiry = timer.start()
+        self.announced[timer.index] = False
+        heapq.heappush(self._heap, (expiry, next(self._heap_seq), timer))
+
     def tick_all(self):
         """
-        Обновляет все активные таймеры каждую секунду,
+        Проверяет все активные таймеры каждую секунду одной операцией над массивами,
         озвучивает имя босса за 3 секунды до окончания таймера,
-        обновляет метки интерфейса.
-        """
-        for timer in self.timers:
-            if timer.is_active() and timer.remaining == 3:
-                self.speech.speak(timer.name)
-            timer.tick()
+        окрашивает закончившиеся таймеры в зелёный и обновляет метки интерфейса.
+        """
+        remaining = self.expiry - time.monotonic()
+        announce = self.active & ~self.announced & (remaining <= 3)
+        self.announced |= announce
+        for index in np.flatnonzero(announce):
+            self.speech.speak(self.timers[index].name)
+        finished = self.active & (remaining <= 0)
+        self.active[finished] = False
+        for index in np.flatnonzero(finished):
+            self.timers[index].set_text_color("green")
         self.update_labels()
 
     def update_labels(self):
         """
-        Обновляет метки следующего босса и оставшегося времени.
+        Обновляет метки следующего босса и оставшегося времени по вершине кучи.
+        Записи закончившихся или перезапущенных таймеров снимаются с вершины.
         Если активных таймеров нет — очищает метки.
         """
-        active_timers = [t for t in self.timers if t.is_active()]
-        if active_timers:
-            next_timer = min(active_timers, key=lambda t: t.remaining)
-            self.ui.label_next.setText(next_timer.name)
-            self.ui.label_timer.setText(next_timer.get_time())
+        while self._heap:
+            expiry, _, timer = self._heap[0]
+            if timer.active and timer.expiry == expiry:
+                break
+            heapq.heappop(self._heap)
+        if self._heap:
+            next_timer = self._heap[0][2]
+            self._set_next_labels(next_timer.name, next_timer.get_time())
         else:
-            self.ui.label_next.setText("")
-            self.ui.label_timer.setText("")
+            self._set_next_labels("", "")
+
+    def _set_next_labels(self, name, time_text):
+        """
+        Обновляет метки следующего босса и оставшегося времени, вызывая setText
+        только для тех меток, текст которых действительно изменился.
+
+        Аргументы:
+            name (str): Имя следующего босса.
+            time_text (str): Оставшееся время в формате MM:SS.
+        """
+        if name != self._last_next:
+            self.ui.label_next.setText(name)
+            self._last_next = name
+        if time_text != self._last_time:
+            self.ui.label_timer.setText(time_text)
+            self._last_time = time_text
 
     def toggle_scanner(self):
         """
@@ -338,12 +913,12 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.scanner_active:
             self.scanner_thread.stop_scan()
             self.ui.btn_scaner.setText("Сканер деактивирован")
-            self.ui.btn_scaner.setStyleSheet("color: red;")
+            self.ui.btn_scaner.setPalette(MainWindow._PALETTES["red"])
             self.speech.speak("Сканер деактивирован")
         else:
             self.scanner_thread.start_scan()
             self.ui.btn_scaner.setText("Сканер активирован")
-            self.ui.btn_scaner.setStyleSheet("color: green;")
+            self.ui.btn_scaner.setPalette(MainWindow._PALETTES["green"])
             self.speech.speak("Сканер активирован")
         self.scanner_active = not self.scanner_active
         self.ui.btn_scaner.setFont(self.scaner_font)
@@ -357,20 +932,39 @@ class MainWindow(QtWidgets.QMainWindow):
         Аргументы:
             boss_name (str): Имя обнаруженного босса.
         """
-        for timer in self.timers:
-            if timer.name == boss_name:
-                timer.start()
-                self.ui.label_now.setText(boss_name)
-                break
+        timer = self._timer_by_name.get(boss_name)
+        if timer:
+            self.start_timer(timer)
+            self.ui.label_now.setText(boss_name)
+
+    def on_capture_bbox_located(self, x, y, width, height):
+        """
+        Обработчик сигнала определения области захвата сканером.
+        Сохраняет область в настройки, чтобы при следующем запуске сразу сканировать только её.
+
+        Аргументы:
+            x (int): Левая граница области.
+            y (int): Верхняя граница области.
+            width (int): Ширина области.
+            height (int): Высота области.
+        """
+        self.config["capture_bbox"] = [x, y, width, height]
+        save_config(self.config)
+
+    def on_capture_bbox_reset(self):
+        """
+        Обработчик сигнала сброса области захвата сканером.
+        Удаляет область из настроек, чтобы следующий запуск начинался с поиска по всему монитору.
+        """
+        if self.config.pop("capture_bbox", None) is not None:
+            save_config(self.config)
 
     def closeEvent(self, event):
         """
         Обработчик закрытия окна.
         Корректно останавливает потоки сканера и озвучки.
         """
-        self.scanner_thread.stop_scan()
-        self.scanner_thread.quit()
-        self.scanner_thread.wait()
+        self.scanner_thread.shutdown()
         self.speech.stop()
         super().closeEvent(event)
 